@@ -1,4 +1,14 @@
+import argparse
 import json
+import mmap
+import os
+import re
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from collections import OrderedDict
 
 # -------------------------
 # Funções de Ler/Salvar JSON
@@ -20,11 +30,132 @@ def ler_arquivo(nome_arquivo):
         return []
 
 
+# No Windows não é possível substituir um arquivo que outro processo abriu
+# sem compartilhamento de exclusão (ex.: outra instância lendo com open());
+# nesse caso a troca é tentada de novo algumas vezes antes de desistir
+TENTATIVAS_SUBSTITUIR = 50
+ESPERA_SUBSTITUIR = 0.1  # segundos entre as tentativas
+
+
 def salvar_arquivo(lista_qualquer, nome_arquivo):
     """Salva a lista de dicionários no arquivo JSON.
+    Grava em um arquivo temporário (nome único, na mesma pasta) e troca de
+    uma vez com os.replace, assim quem estiver lendo o arquivo antigo nunca
+    vê um conteúdo pela metade. Se algo falhar, o temporário é apagado.
+    No Windows, se o arquivo continuar em uso depois de todas as tentativas,
+    gera PermissionError e o arquivo original fica intacto.
+    """
+    pasta = os.path.dirname(os.path.abspath(nome_arquivo))
+    temporario = tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=pasta, prefix=os.path.basename(nome_arquivo) + ".",
+        suffix=".tmp", delete=False)
+    try:
+        with temporario as f:
+            json.dump(lista_qualquer, f, ensure_ascii=False, indent=4)
+        copiar_permissoes(nome_arquivo, temporario.name)
+        substituir_arquivo(temporario.name, nome_arquivo)
+    except BaseException:
+        try:
+            os.remove(temporario.name)
+        except FileNotFoundError:
+            pass
+        raise
+    # Toda escrita invalida as listagens que dependem deste arquivo
+    invalidar_visoes(nome_arquivo)
+
+
+def copiar_permissoes(nome_arquivo, temporario):
+    """Dá ao temporário as permissões do arquivo atual (ou as padrão, se
+    ele ainda não existir), já que NamedTemporaryFile cria com 0600.
+    """
+    try:
+        modo = stat.S_IMODE(os.stat(nome_arquivo).st_mode)
+    except FileNotFoundError:
+        mascara = os.umask(0)
+        os.umask(mascara)
+        modo = 0o666 & ~mascara
+    os.chmod(temporario, modo)
+
+
+def substituir_arquivo(temporario, nome_arquivo):
+    """Troca nome_arquivo pelo temporário, tentando de novo enquanto o
+    arquivo estiver em uso por outro processo (PermissionError no Windows).
     """
-    with open(nome_arquivo, 'w', encoding='utf-8') as f:
-        json.dump(lista_qualquer, f, ensure_ascii=False, indent=4)
+    for tentativa in range(TENTATIVAS_SUBSTITUIR):
+        try:
+            os.replace(temporario, nome_arquivo)
+            return
+        except PermissionError:
+            if tentativa == TENTATIVAS_SUBSTITUIR - 1:
+                raise
+            time.sleep(ESPERA_SUBSTITUIR)
+
+
+# -------------------------
+# Cache de listagens (visões)
+# -------------------------
+# Guarda o texto já montado das listagens com junções (turmas, matrículas).
+# Cada entrada guarda a assinatura (st_dev, st_ino, st_mtime_ns, st_size) dos
+# arquivos de que depende: se algum deles mudar, inclusive por outra instância
+# do sistema, a entrada é montada de novo. Como salvar_arquivo sempre troca o
+# arquivo por um novo (os.replace), o inode muda a cada gravação do sistema,
+# mesmo que a data e o tamanho continuem iguais. Salvar um arquivo por aqui também descarta
+# na hora as entradas que dependem dele. Quando o total passa do limite,
+# as entradas usadas há mais tempo são removidas primeiro (LRU).
+
+LIMITE_CACHE_VISOES = 4 * 1024 * 1024  # limite em bytes do texto guardado
+
+_cache_visoes = OrderedDict()  # nome da visão -> (texto, assinaturas, tamanho)
+_bytes_cache_visoes = 0
+
+
+def assinatura_arquivo(nome_arquivo):
+    """Retorna (st_dev, st_ino, st_mtime_ns, st_size) do arquivo,
+    ou None se ele não existir.
+    """
+    try:
+        info = os.stat(nome_arquivo)
+    except FileNotFoundError:
+        return None
+    return (info.st_dev, info.st_ino, info.st_mtime_ns, info.st_size)
+
+
+def obter_visao(nome_visao, dependencias, montar):
+    """Retorna o texto da visão, montando-o com montar() só se não estiver no cache.
+    dependencias: arquivos cujas alterações invalidam a visão.
+    """
+    global _bytes_cache_visoes
+    # A assinatura é tirada antes de montar: se o arquivo mudar durante a
+    # montagem, a próxima chamada percebe a diferença
+    assinaturas = {arq: assinatura_arquivo(arq) for arq in dependencias}
+    if nome_visao in _cache_visoes:
+        texto, assinaturas_antigas, tamanho = _cache_visoes.pop(nome_visao)
+        _bytes_cache_visoes -= tamanho
+        if assinaturas_antigas == assinaturas:
+            _cache_visoes[nome_visao] = (texto, assinaturas_antigas, tamanho)
+            _bytes_cache_visoes += tamanho
+            return texto
+
+    texto = montar()
+    tamanho = len(texto.encode('utf-8'))
+    if tamanho > LIMITE_CACHE_VISOES:
+        # Visão maior que o limite inteiro: não vale a pena guardar
+        return texto
+    _cache_visoes[nome_visao] = (texto, assinaturas, tamanho)
+    _bytes_cache_visoes += tamanho
+    while _bytes_cache_visoes > LIMITE_CACHE_VISOES:
+        _, (_, _, tamanho_antigo) = _cache_visoes.popitem(last=False)
+        _bytes_cache_visoes -= tamanho_antigo
+    return texto
+
+
+def invalidar_visoes(nome_arquivo):
+    """Remove do cache todas as visões que dependem do arquivo informado.
+    """
+    global _bytes_cache_visoes
+    for nome_visao in [n for n, (_, deps, _) in _cache_visoes.items() if nome_arquivo in deps]:
+        _, _, tamanho = _cache_visoes.pop(nome_visao)
+        _bytes_cache_visoes -= tamanho
 
 
 # -------------------------
@@ -385,23 +516,29 @@ def incluir_turma():
     print("Turma incluída com sucesso.")
 
 
-def listar_turmas():
+def montar_listagem_turmas():
     lista = ler_arquivo(ARQ_TURMAS)
     if not lista:
-        print("Não há turmas cadastradas.")
-        return
-    print("---- Turmas ----")
+        return "Não há turmas cadastradas."
+    # Lê professores e disciplinas uma única vez para fazer a junção
+    professores = ler_arquivo(ARQ_PROFESSORES)
+    disciplinas = ler_arquivo(ARQ_DISCIPLINAS)
+    linhas = ["---- Turmas ----"]
     for t in lista:
         # Mostra também o nome do professor e da disciplina para facilitar leitura
-        prof = encontrar_por_codigo(ler_arquivo(
-            ARQ_PROFESSORES), t.get("CodProfessor"))
-        disc = encontrar_por_codigo(ler_arquivo(
-            ARQ_DISCIPLINAS), t.get("CodDisciplina"))
+        prof = encontrar_por_codigo(professores, t.get("CodProfessor"))
+        disc = encontrar_por_codigo(disciplinas, t.get("CodDisciplina"))
         nome_prof = prof["Nome"] if prof else "Professor não encontrado"
         nome_disc = disc["Nome"] if disc else "Disciplina não encontrada"
-        print(
+        linhas.append(
             f"Código: {t['Código']} | Professor: ({t['CodProfessor']}) {nome_prof} | Disciplina: ({t['CodDisciplina']}) {nome_disc}")
-    print("----------------")
+    linhas.append("----------------")
+    return "\n".join(linhas)
+
+
+def listar_turmas():
+    print(obter_visao("turmas", [ARQ_TURMAS, ARQ_PROFESSORES, ARQ_DISCIPLINAS],
+                      montar_listagem_turmas))
 
 
 def atualizar_turma():
@@ -495,23 +632,29 @@ def incluir_matricula():
     print("Matrícula incluída com sucesso.")
 
 
-def listar_matriculas():
+def montar_listagem_matriculas():
     lista = ler_arquivo(ARQ_MATRICULAS)
     if not lista:
-        print("Não há matrículas cadastradas.")
-        return
-    print("---- Matrículas ----")
+        return "Não há matrículas cadastradas."
+    # Lê estudantes e turmas uma única vez para fazer a junção
+    estudantes = ler_arquivo(ARQ_ESTUDANTES)
+    turmas = ler_arquivo(ARQ_TURMAS)
+    linhas = ["---- Matrículas ----"]
     for m in lista:
         # Exibe o nome do estudante e a referência da turma para facilitar leitura
-        est = encontrar_por_codigo(ler_arquivo(
-            ARQ_ESTUDANTES), m.get("CodEstudante"))
-        turma = encontrar_por_codigo(
-            ler_arquivo(ARQ_TURMAS), m.get("CodTurma"))
+        est = encontrar_por_codigo(estudantes, m.get("CodEstudante"))
+        turma = encontrar_por_codigo(turmas, m.get("CodTurma"))
         nome_est = est["Nome"] if est else "Estudante não encontrado"
         info_turma = f"Turma {m.get('CodTurma')}" if turma else "Turma não encontrada"
-        print(
+        linhas.append(
             f"Código: {m['Código']} | Estudante: ({m['CodEstudante']}) {nome_est} | {info_turma}")
-    print("---------------------")
+    linhas.append("---------------------")
+    return "\n".join(linhas)
+
+
+def listar_matriculas():
+    print(obter_visao("matriculas", [ARQ_MATRICULAS, ARQ_ESTUDANTES, ARQ_TURMAS],
+                      montar_listagem_matriculas))
 
 
 def atualizar_matricula():
@@ -602,80 +745,309 @@ def gerenciar_entidade(opcao_entidade):
         # Para cada entidade verificamos a operação escolhida e chamamos
         # a função correspondente.
 
-        # Estudantes
-        if opcao_entidade == "1":
-            if oper == "1":
-                incluir_estudante()
-            elif oper == "2":
-                listar_estudantes()
-            elif oper == "3":
-                atualizar_estudante()
-            elif oper == "4":
-                excluir_estudante()
-            elif oper == "0":
-                break
-            else:
-                print("Opção inválida.")
-
-        # Disciplinas
-        elif opcao_entidade == "2":
-            if oper == "1":
-                incluir_disciplina()
-            elif oper == "2":
-                listar_disciplinas()
-            elif oper == "3":
-                atualizar_disciplina()
-            elif oper == "4":
-                excluir_disciplina()
-            elif oper == "0":
-                break
-            else:
-                print("Opção inválida.")
-
-        # Turmas
-        elif opcao_entidade == "3":
-            if oper == "1":
-                incluir_turma()
-            elif oper == "2":
-                listar_turmas()
-            elif oper == "3":
-                atualizar_turma()
-            elif oper == "4":
-                excluir_turma()
-            elif oper == "0":
-                break
-            else:
-                print("Opção inválida.")
-
-        # Matrículas
-        elif opcao_entidade == "4":
-            if oper == "1":
-                incluir_matricula()
-            elif oper == "2":
-                listar_matriculas()
-            elif oper == "3":
-                atualizar_matricula()
-            elif oper == "4":
-                excluir_matricula()
-            elif oper == "0":
-                break
-            else:
-                print("Opção inválida.")
-
-        # Professores
-        elif opcao_entidade == "5":
-            if oper == "1":
-                incluir_professor()
-            elif oper == "2":
-                listar_professores()
-            elif oper == "3":
-                atualizar_professor()
-            elif oper == "4":
-                excluir_professor()
-            elif oper == "0":
-                break
-            else:
-                print("Opção inválida.")
+        try:
+            # Estudantes
+            if opcao_entidade == "1":
+                if oper == "1":
+                    incluir_estudante()
+                elif oper == "2":
+                    listar_estudantes()
+                elif oper == "3":
+                    atualizar_estudante()
+                elif oper == "4":
+                    excluir_estudante()
+                elif oper == "0":
+                    break
+                else:
+                    print("Opção inválida.")
+
+            # Disciplinas
+            elif opcao_entidade == "2":
+                if oper == "1":
+                    incluir_disciplina()
+                elif oper == "2":
+                    listar_disciplinas()
+                elif oper == "3":
+                    atualizar_disciplina()
+                elif oper == "4":
+                    excluir_disciplina()
+                elif oper == "0":
+                    break
+                else:
+                    print("Opção inválida.")
+
+            # Turmas
+            elif opcao_entidade == "3":
+                if oper == "1":
+                    incluir_turma()
+                elif oper == "2":
+                    listar_turmas()
+                elif oper == "3":
+                    atualizar_turma()
+                elif oper == "4":
+                    excluir_turma()
+                elif oper == "0":
+                    break
+                else:
+                    print("Opção inválida.")
+
+            # Matrículas
+            elif opcao_entidade == "4":
+                if oper == "1":
+                    incluir_matricula()
+                elif oper == "2":
+                    listar_matriculas()
+                elif oper == "3":
+                    atualizar_matricula()
+                elif oper == "4":
+                    excluir_matricula()
+                elif oper == "0":
+                    break
+                else:
+                    print("Opção inválida.")
+
+            # Professores
+            elif opcao_entidade == "5":
+                if oper == "1":
+                    incluir_professor()
+                elif oper == "2":
+                    listar_professores()
+                elif oper == "3":
+                    atualizar_professor()
+                elif oper == "4":
+                    excluir_professor()
+                elif oper == "0":
+                    break
+                else:
+                    print("Opção inválida.")
+        except PermissionError:
+            # salvar_arquivo desistiu: o arquivo continua em uso por outro processo
+            print("Não foi possível salvar: o arquivo está em uso por outro processo. "
+                  "Nada foi alterado, tente novamente.")
+
+
+# -------------------------
+# Modo de consulta (somente leitura)
+# -------------------------
+# Permite consultas grandes (ex.: todas as matrículas de um estudante) sem
+# carregar o arquivo inteiro em memória e sem atrapalhar quem está gravando.
+# O arquivo é mapeado em memória (mmap) e percorrido registro a registro.
+# Como salvar_arquivo troca o arquivo inteiro com os.replace, o mapeamento
+# aberto continua apontando para a versão antiga: é um retrato imutável.
+# No Windows o arquivo é aberto com compartilhamento de exclusão
+# (FILE_SHARE_DELETE), que permite ao os.replace trocá-lo mesmo aberto; o
+# conteúdo é copiado para um temporário e o mapeamento é feito na cópia.
+# Assim a consulta nunca impede uma gravação, qualquer que seja o tamanho.
+
+ENTIDADES_CONSULTA = {
+    "estudantes": ARQ_ESTUDANTES,
+    "professores": ARQ_PROFESSORES,
+    "disciplinas": ARQ_DISCIPLINAS,
+    "turmas": ARQ_TURMAS,
+    "matriculas": ARQ_MATRICULAS,
+}
+
+# Campos que cada entidade grava (os mesmos montados nas funções incluir_*)
+CAMPOS_CONSULTA = {
+    "estudantes": ("Código", "Nome", "CPF"),
+    "professores": ("Código", "Nome", "CPF"),
+    "disciplinas": ("Código", "Nome"),
+    "turmas": ("Código", "CodProfessor", "CodDisciplina"),
+    "matriculas": ("Código", "CodTurma", "CodEstudante"),
+}
+
+# Campos gravados como int (lidos com input_int); os demais são texto
+CAMPOS_INTEIROS = {"Código", "CodProfessor", "CodDisciplina", "CodTurma", "CodEstudante"}
+
+
+def abrir_compartilhado_windows(nome_arquivo):
+    """Abre o arquivo para leitura no Windows sem impedir que ele seja
+    substituído ou apagado por outro processo enquanto estiver aberto.
+    """
+    import ctypes
+    import msvcrt
+    from ctypes import wintypes
+
+    GENERIC_READ = 0x80000000
+    FILE_SHARE_READ_WRITE_DELETE = 0x1 | 0x2 | 0x4
+    OPEN_EXISTING = 3
+    FILE_ATTRIBUTE_NORMAL = 0x80
+    INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+    ERROS_NAO_ENCONTRADO = (2, 3)  # ERROR_FILE_NOT_FOUND, ERROR_PATH_NOT_FOUND
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.CreateFileW.argtypes = [
+        wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+        wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+    kernel32.CreateFileW.restype = wintypes.HANDLE
+
+    handle = kernel32.CreateFileW(
+        os.path.abspath(nome_arquivo), GENERIC_READ, FILE_SHARE_READ_WRITE_DELETE,
+        None, OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, None)
+    if handle == INVALID_HANDLE_VALUE:
+        erro = ctypes.get_last_error()
+        if erro in ERROS_NAO_ENCONTRADO:
+            raise FileNotFoundError(nome_arquivo)
+        raise ctypes.WinError(erro)
+    descritor = msvcrt.open_osfhandle(handle, os.O_RDONLY | os.O_BINARY)
+    return os.fdopen(descritor, 'rb')
+
+
+def abrir_snapshot(nome_arquivo):
+    """Mapeia o arquivo em memória somente para leitura.
+    Retorna (mapa, cópia): cópia é o arquivo temporário usado no Windows
+    (None nos demais sistemas) e deve ser apagada depois de mapa.close().
+    Retorna (None, None) se o arquivo não existir ou estiver vazio.
+    """
+    copia = None
+    if os.name == "nt":
+        descritor, copia = tempfile.mkstemp(suffix=".json")
+        try:
+            with abrir_compartilhado_windows(nome_arquivo) as origem, \
+                    os.fdopen(descritor, 'wb') as destino:
+                shutil.copyfileobj(origem, destino)
+        except FileNotFoundError:
+            os.remove(copia)
+            return None, None
+        except BaseException:
+            os.remove(copia)
+            raise
+        nome_arquivo = copia
+    try:
+        with open(nome_arquivo, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                # O mapeamento continua válido depois que o arquivo é fechado
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), copia
+    except FileNotFoundError:
+        pass
+    if copia is not None:
+        os.remove(copia)
+    return None, None
+
+
+# Próximo caractere que importa para achar o fim de um registro
+_TOKEN_REGISTRO = re.compile(rb'["{}]')
+# Texto JSON completo entre aspas, com escapes (\" e \\)
+_TEXTO_JSON = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# O que pode aparecer entre registros: espaços, vírgulas e os colchetes da lista
+_SEPARADORES_JSON = b" \t\r\n,[]"
+
+
+def fim_do_registro(mapa, inicio):
+    """Retorna a posição logo após a "}" que fecha o objeto iniciado em inicio.
+    Conta chaves aninhadas e ignora as que estão dentro de textos.
+    Gera ValueError se o objeto ou algum texto não for fechado.
+    """
+    profundidade = 0
+    pos = inicio
+    while True:
+        achado = _TOKEN_REGISTRO.search(mapa, pos)
+        if achado is None:
+            raise ValueError(f"registro iniciado no byte {inicio} não foi fechado")
+        token = achado.group()
+        if token == b'"':
+            texto = _TEXTO_JSON.match(mapa, achado.start())
+            if texto is None:
+                raise ValueError(f"texto iniciado no byte {achado.start()} não foi fechado")
+            pos = texto.end()
+            continue
+        pos = achado.end()
+        profundidade += 1 if token == b"{" else -1
+        if profundidade == 0:
+            return pos
+
+
+def iterar_registros(mapa):
+    """Percorre o conteúdo mapeado e devolve um dicionário por vez.
+    Aceita tanto a lista JSON gravada pelo sistema quanto JSON Lines
+    (um objeto por linha). Gera ValueError, com a posição em bytes,
+    se encontrar conteúdo inválido, para que a consulta nunca pareça
+    completa quando não foi.
+    """
+    pos = 0
+    while True:
+        inicio = mapa.find(b"{", pos)
+        fim_trecho = len(mapa) if inicio == -1 else inicio
+        if mapa[pos:fim_trecho].translate(None, _SEPARADORES_JSON):
+            raise ValueError(f"conteúdo inválido entre os bytes {pos} e {fim_trecho}")
+        if inicio == -1:
+            return
+        pos = fim_do_registro(mapa, inicio)
+        try:
+            registro = json.loads(mapa[inicio:pos])
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ValueError(f"registro inválido no byte {inicio}") from None
+        yield registro
+
+
+def converter_valor(campo, valor):
+    """Converte o valor do filtro para o tipo gravado no campo.
+    Campos inteiros viram int ("200" -> 200); CPF e Nome continuam texto.
+    Gera ValueError se um campo inteiro receber algo que não é número.
+    """
+    if campo in CAMPOS_INTEIROS:
+        return int(valor)
+    return valor
+
+
+def consultar(entidade, filtros):
+    """Escreve em stdout, um por linha, os registros da entidade que
+    atendem a todos os filtros (campo -> valor). Retorna quantos foram escritos.
+    """
+    mapa, copia = abrir_snapshot(ENTIDADES_CONSULTA[entidade])
+    if mapa is None:
+        return 0
+    total = 0
+    try:
+        for item in iterar_registros(mapa):
+            if all(item.get(campo) == valor for campo, valor in filtros.items()):
+                sys.stdout.write(" | ".join([f"{k}: {v}" for k, v in item.items()]) + "\n")
+                total += 1
+    finally:
+        mapa.close()
+        if copia is not None:
+            os.remove(copia)
+    return total
+
+
+def executar_consulta(argumentos):
+    """Trata a linha de comando do modo de consulta.
+    Ex.: python school.py --consulta matriculas CodEstudante=200
+    """
+    parser = argparse.ArgumentParser(
+        prog="school.py --consulta",
+        description="Consulta somente leitura sobre um retrato dos arquivos JSON.")
+    parser.add_argument("entidade", choices=sorted(ENTIDADES_CONSULTA))
+    parser.add_argument("filtros", nargs="*", metavar="Campo=valor")
+    args = parser.parse_args(argumentos)
+
+    filtros = {}
+    for filtro in args.filtros:
+        campo, separador, valor = filtro.partition("=")
+        if not separador or not campo:
+            parser.error(f"filtro inválido: {filtro} (use Campo=valor)")
+        campos = CAMPOS_CONSULTA[args.entidade]
+        if campo not in campos:
+            parser.error(
+                f"campo inválido para {args.entidade}: {campo} (use {', '.join(campos)})")
+        try:
+            filtros[campo] = converter_valor(campo, valor)
+        except ValueError:
+            parser.error(f"o campo {campo} precisa de um número inteiro: {valor}")
+
+    try:
+        total = consultar(args.entidade, filtros)
+    except BrokenPipeError:
+        # Quem lia a saída (ex.: head, less) já fechou o pipe: não é erro.
+        # Aponta stdout para devnull para o Python não reclamar ao encerrar.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(0)
+    except ValueError as erro:
+        print(f"Erro ao ler {ENTIDADES_CONSULTA[args.entidade]}: {erro}. "
+              "A consulta foi interrompida e o resultado está incompleto.", file=sys.stderr)
+        sys.exit(1)
+    print(f"{total} registro(s) encontrado(s).", file=sys.stderr)
 
 
 # -------------------------
@@ -696,4 +1068,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "--consulta":
+        executar_consulta(sys.argv[2:])
+    else:
+        main()